@@ -80,8 +80,7 @@ def export_studies_with_sequences(req_path, not_req_path, studies, req_studies):
     n.write(col_names)
 
     for study in top_level_studies:
-        wgs, wes = studies[study]["wgs"], studies[study]["wes"]
-        both = str(int(wgs) + int(wes))
+        wgs, wes, both = studies[study]["wgs"], studies[study]["wes"], studies[study]["wgs+wes"]
         cons = studies[study]["cons"]
         name = studies[study]["name"]
         url = "https://www.ncbi.nlm.nih.gov/projects/gap/cgi-bin/study.cgi?study_id=" + study
@@ -14,13 +14,20 @@ if __name__ == "__main__":
     parser.add_argument("-u", "--updatefile", default=None, type=str,
         help="File to write the update diff to (in human-readable format). If not provided, writes to stdout."
     )
+    parser.add_argument("-s", "--snapshotdir", default=None, type=str,
+        help="Directory in which to record a snapshot of this run's study info (optional)."
+    )
+    parser.add_argument("-x", "--versionindex", default=None, type=str,
+        help="File containing the index of newest known study versions, updated by this run (optional)."
+    )
     parser.add_argument("-v", "--verbose", action="store_true",
         help="If set, print out (to stdout) scraping updates."
     )
 
     args = parser.parse_args()
 
-    upd = Updater(args.infile, args.outfile)
+    upd = Updater(args.infile, args.outfile, snapshot_dir=args.snapshotdir,
+        version_index_path=args.versionindex)
 
     if args.updatefile:
         # Write the update to a file
@@ -0,0 +1,152 @@
+import re
+import json
+import util
+
+
+CHUNK_SIZE = 1 << 16  # Number of characters read at a time from study files
+_WHITESPACE_REGEX = re.compile(r"\s*")
+_interned_strings = {}
+
+
+def intern_string(string):
+    """
+    Returns a canonical copy of `string`, so that equal strings (e.g.
+    consent groups repeated across studies) share one object.
+    Unlike the builtin `intern`, this also works for unicode strings.
+    Only use this for strings from a small vocabulary, since interned
+    strings are kept for the lifetime of the program.
+    """
+    return _interned_strings.setdefault(string, string)
+
+
+class StudyRecord(object):
+    """
+    Compact, read-only representation of the info for one top-level study,
+    as `Scraper.get_study_info` returns it.
+    Consent groups are interned, and substudies are kept as their encoded
+    JSON; they are only decoded when `subs` is accessed, and are not kept
+    around after that.
+    Initialization:
+        record = StudyRecord.from_dict(study_info)
+    Attributes:
+        record.full_id, record.part_id, record.version, record.name,
+        record.consents, record.counts, record.subs
+    Methods:
+        record.to_dict()
+    """
+
+    __slots__ = ("full_id", "part_id", "version", "name", "consents",
+            "wgs_num", "wes_num", "seq_total", "_subs_json")
+
+    @classmethod
+    def from_dict(cls, study):
+        """
+        Builds a record from a dictionary of study info, with keys "id",
+        "name", "subs", "consents", and "counts". If "counts" is missing
+        (study info scraped before counts were stored), the counts are
+        computed from the substudies.
+        """
+        record = cls()
+        record.full_id = study["id"]["full"]
+        record.part_id = study["id"]["part"]
+        record.version = study["id"]["version"]
+        record.name = study["name"]
+        record.consents = tuple(intern_string(consent) for consent in study["consents"])
+        subs = study["subs"]
+        if "counts" in study:
+            counts = study["counts"]
+        else:
+            counts = util.sum_sequence_counts([util.sequence_counts(subs[sub]["seqs"]) for sub in subs])
+        record.wgs_num, record.wes_num, record.seq_total = counts["wgs"], counts["wes"], counts["total"]
+        record._subs_json = json.dumps(subs, separators=(",", ":"))
+        return record
+
+    @property
+    def counts(self):
+        """
+        The total numbers of whole genome and whole exome sequences over all
+        substudies: {wgs: 300, wes: 300, total: 600}
+        """
+        return {"wgs": self.wgs_num, "wes": self.wes_num, "total": self.seq_total}
+
+    @property
+    def subs(self):
+        """
+        The substudies, decoded anew on each access:
+            phs1234567.v1.p1: {name: ..., seqs: {type1: 100}, counts: {...}},
+            ...
+        """
+        return json.loads(self._subs_json)
+
+    def to_dict(self):
+        """
+        Returns the study info as a dictionary, in the same form as
+        `Scraper.get_study_info`.
+        """
+        return {
+            "id": {"full": self.full_id, "part": self.part_id, "version": self.version},
+            "name": self.name,
+            "subs": self.subs,
+            "counts": self.counts,
+            "consents": list(self.consents)
+        }
+
+
+def iter_study_records(file_path):
+    """
+    From `file_path`, a JSON list of study info dictionaries, yields a
+    `StudyRecord` for each study. The file is read `CHUNK_SIZE` characters at
+    a time and studies are decoded one at a time, so neither the whole file
+    nor the whole list of dictionaries is held in memory at once.
+    Raises a ValueError if the file is empty, truncated, or not a JSON list
+    of objects.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r") as json_file:
+        text, index, eof = "", 0, False
+        expected = "["  # Then "{" or "]" for the first study, then "," or "]"
+        while True:
+            index = _WHITESPACE_REGEX.match(text, index).end()
+            if index < len(text):
+                char = text[index]
+                if char not in expected:
+                    break
+                if char == "]":
+                    return
+                if char == "[":
+                    expected, index = "{]", index + 1
+                    continue
+                if char == ",":
+                    expected, index = "{", index + 1
+                    continue
+                try:
+                    study, index = decoder.raw_decode(text, index)
+                except ValueError:
+                    pass  # Study may continue past what has been read so far
+                else:
+                    expected = ",]"
+                    yield StudyRecord.from_dict(study)
+                    continue
+            if eof:
+                break
+            chunk = json_file.read(CHUNK_SIZE)
+            eof = not chunk
+            text, index = text[index:] + chunk, 0
+    raise ValueError("{0} does not contain a JSON list".format(file_path))
+
+
+def export_study_records(file_path, records):
+    """
+    Export the `StudyRecord`s in `records` to `file_path` as a JSON list of
+    study info dictionaries, pretty-printed like `util.export_json`. Records
+    are written one at a time.
+    """
+    with open(file_path, "w") as json_file:
+        json_file.write("[")
+        num_written = 0
+        for record in records:
+            json_str = json.dumps(record.to_dict(), indent=2)
+            json_file.write(",\n  " if num_written else "\n  ")
+            json_file.write(json_str.replace("\n", "\n  "))
+            num_written += 1
+        json_file.write("\n]" if num_written else "]")
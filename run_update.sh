@@ -9,9 +9,11 @@ fi
 json="/cluster/u/amtseng/dbgap_scrape/data/studies_cron.json"
 diff="/cluster/u/amtseng/dbgap_scrape/data/diff_cron.txt"
 email="/cluster/u/amtseng/dbgap_scrape/data/email_cron.txt"
+snapshots="/cluster/u/amtseng/dbgap_scrape/data/snapshots"
+versions="/cluster/u/amtseng/dbgap_scrape/data/versions_cron.json"
 
 # Run scraper
-python /cluster/u/amtseng/dbgap_scrape/main.py -i $json -o $json -u $diff -v
+python /cluster/u/amtseng/dbgap_scrape/main.py -i $json -o $json -u $diff -s $snapshots -x $versions -v
 
 # Email contents of diff
 echo "Subject: dbGaP scrape: new studies and updates" > $email
@@ -20,21 +20,38 @@ class Scraper:
         scr = Scraper()  # Use entire list of top studies
         scr = Scraper(["phs1234567", "phs7654321"])  # Use this partial list
                                                      # of top studies
+        scr = Scraper(version_index=VersionIndex("versions.json"))
+                                                     # Fetch newest known
+                                                     # versions directly
     Methods:
         scr.get_top_study_list(verbose=False)
         scr.get_all_full_top_study_ids(verbose=False)
         scr.get_study_info(study_id, verbose=False)
     """
 
-    def __init__(self, partial_study_ids=None):
+    def __init__(self, partial_study_ids=None, version_index=None):
         """
         If `partial_study_ids` is passed in, then methods like
         `get_top_study_list` and `get_all_full_top_study_ids` will only
         look through these study IDs.
         Note that this must be a list of strings, each of the form
         "phs1234567".
+        If `version_index` (a `VersionIndex`) is passed in, every full study
+        ID seen is recorded in it, and it is consulted for the newest version
+        of each top study.
+        `num_study_pages` and `num_redirects` count the studies scraped for
+        sequences, and how many of them were first fetched at a version that
+        was not the newest (so the newest version had to be fetched in
+        addition).
+        `fallback_ids` maps full study IDs taken from `version_index` to the
+        full study IDs the FTP mirror listed instead, to retry with if the
+        newer version cannot be scraped.
         """
         self.partial_study_ids = partial_study_ids
+        self.version_index = version_index
+        self.fallback_ids = {}
+        self.num_study_pages = 0
+        self.num_redirects = 0
 
     def _read_page(self, url, timeout=5, retries=3, verbose=False):
         """
@@ -114,6 +131,9 @@ class Scraper:
         version number, and returns that fully-formatted ID.
         This may not be truly the most recent, but this function will at least
         try to find _some_ valid full study ID.
+        If `self.version_index` knows of a newer version than the FTP mirror
+        lists, that version is returned instead, and the version the FTP
+        mirror lists is kept in `self.fallback_ids`.
         """
         url = STUDY_DIRECTORY_URL_FORMAT.format(study_id)
         direc_list_page = self._read_page(url, verbose=verbose)
@@ -123,12 +143,25 @@ class Scraper:
             version = util.version_num(direc)
             if version is None:
                 continue
+            if self.version_index:
+                self.version_index.observe(direc)
             if version > best_version:
                 best_id, best_version = direc, version
 
+        if self.version_index:
+            known_id = self.version_index.latest(study_id)
+            if known_id and util.version_num(known_id) > best_version:
+                if verbose:
+                    print("Newer version known for {0}: {1}".format(study_id, known_id))
+                if best_id is not None:
+                    self.fallback_ids[known_id] = best_id
+                best_id = known_id
+
         if best_id is None:
             # Try searching for the study directly as a last resort
             best_id = self._search_for_full_study_id(study_id, verbose=verbose)
+            if self.version_index:
+                self.version_index.observe(best_id)
 
         return best_id
 
@@ -194,16 +227,6 @@ class Scraper:
         consents = [tag.text for tag in consent_list.find_all("b")]
         return consents
          
-    def _match_data_type(self, data_type):
-        """
-        Given a sequencing data type, returns whether or not the data type is
-        of interest. Looks for the phrases "whole exome" or "whole genome".
-        This function may be tweaked to determine what kind of sequencing data
-        is of interest.
-        """
-        data_type = data_type.lower()
-        return "whole exome" in data_type or "whole genome" in data_type or "wgs" in data_type or "wes" in data_type or "wxs" in data_type
-
     def _get_substudy_sequences(self, soup, study_id):
         """
         Given the parser object for a study's info page, and the fully-
@@ -211,9 +234,12 @@ class Scraper:
         study. If `study_id` is not the lastest version of the study, then use
         the latest version instead.
         Returns a dictionary of dictionaries, mapping substudies to the number
-        of sequences of each type of interest:
-            phs1234567.v1.p1: {seqs: {type1: 100}},
-            phs7654321.v8.p3: {seqs: {type1: 200, type2: 300}}
+        of sequences of each type of interest, and the total numbers of whole
+        genome and whole exome sequences:
+            phs1234567.v1.p1: {seqs: {type1: 100},
+                               counts: {wgs: 100, wes: 0, total: 100}},
+            phs7654321.v8.p3: {seqs: {type1: 200, type2: 300},
+                               counts: {wgs: 200, wes: 300, total: 500}}
             ...
         Also returns the `study_id`, or a newer version if found.
         """
@@ -223,8 +249,12 @@ class Scraper:
             study_history_table = study_history_div.find("table").contents
             # Other studies in history table are links: <td><a href=...>phs1234567.v8.p8</a></td>
             study_history = [item.td.a.string.strip() for item in study_history_table if item.name and item.td and item.td.a]
+            if self.version_index:
+                for history_id in study_history:
+                    self.version_index.observe(history_id)
             newest_id = study_history[-1]
             if newest_id and util.version_num(newest_id) > util.version_num(study_id):
+                self.num_redirects += 1
                 return self._get_substudy_sequences(self._fetch_study_page(newest_id), newest_id)
     
         table = soup.find("tbody")
@@ -240,7 +270,7 @@ class Scraper:
             row_tokens = [item.string for item in row.contents if item.name and item.string]
             # study, data type, group1 samples, group1 subjects, group2 samples, group2 subjects, etc.
             study, data_type, data_nums = row_tokens[0], row_tokens[1], row_tokens[2:]
-            if not self._match_data_type(data_type):
+            if not util.classify_data_type(data_type):
                 continue
            
             num = sum(int(x) for x in data_nums[::2])
@@ -249,6 +279,9 @@ class Scraper:
             except KeyError:
                 subs[study] = {"seqs": {data_type: num}}
 
+        for study in subs:
+            subs[study]["counts"] = util.sequence_counts(subs[study]["seqs"])
+
         return subs, study_id
 
     def get_study_info(self, study_id, substudy_names=False, verbose=False):
@@ -258,15 +291,18 @@ class Scraper:
         If `substudy_names` is True, also include the substudy names.
         Otherwise, these keys are missing.
         Returns a multi-level dictionary with top-level keys: "id", "name",
-        "subs", "consents"
+        "subs", "counts", "consents"
             id:
                 full: study_id
                 part: partial study_id
                 version: version number
             name: study_name
             subs:
-                phs1234567.v1.p1: {name: ..., seqs: {type1: 100}},
-                phs7654321.v8.p3: {name: ..., seqs: {type1: 200, type2: 300}}
+                phs1234567.v1.p1: {name: ..., seqs: {type1: 100},
+                                   counts: {wgs: 100, wes: 0, total: 100}},
+                phs7654321.v8.p3: {name: ..., seqs: {type1: 200, type2: 300},
+                                   counts: {wgs: 200, wes: 300, total: 500}}
+            counts: {wgs: 300, wes: 300, total: 600}  # Sum over substudies
             consents: [consent_group1, consent_group2, ...]
         Returns None if basic information like the title cannot be found.
         """
@@ -274,6 +310,7 @@ class Scraper:
         name = self._get_study_title(soup)
         if not name:
             return None
+        self.num_study_pages += 1
         subs, study_id  = self._get_substudy_sequences(soup, study_id)
         # ^-- also update study_id, since a newer version may have been found
         if substudy_names:
@@ -282,10 +319,12 @@ class Scraper:
                 subs[substudy]["name"] = name if name else ""
         fields = util.study_id_fields(study_id)
         consents = self._get_study_consents(soup)
+        counts = util.sum_sequence_counts([subs[substudy]["counts"] for substudy in subs])
         return {
             "id": {"full": study_id, "part": fields[0], "version": fields[1]},
             "name": name,
             "subs": subs,
+            "counts": counts,
             "consents": consents
         }
 
@@ -0,0 +1,249 @@
+import os
+import json
+import zlib
+import hashlib
+import datetime
+import util
+from records import StudyRecord
+
+
+CHECKPOINT_INTERVAL = 30  # Store a full index every this many runs
+OBJECT_DIR_NAME = "objects"
+RUN_DIR_NAME = "runs"
+
+
+class SnapshotStore:
+    """
+    Delta-compressed history of scraping runs, kept in a directory.
+    Each study record is stored once, compressed, under the hash of its
+    contents. Each run is stored as a manifest that only lists the studies
+    whose records changed (or were removed) since the previous run, so
+    unchanged studies cost nothing to keep around.
+    Every `CHECKPOINT_INTERVAL` runs, the manifest lists the full index
+    instead, which bounds the number of deltas replayed on reconstruction.
+    Initialization:
+        store = SnapshotStore("data/snapshots")
+        store = SnapshotStore("data/snapshots", create=False)  # Must exist
+    Methods:
+        store.run_dates()
+        store.record_run(study_info, date=None)
+        store.get_snapshot(date)
+        store.diff(old_date, new_date)
+    """
+
+    def __init__(self, store_dir, create=True):
+        """
+        `store_dir` is the directory in which the snapshot history is kept.
+        If `create` is True (the default), it is created if it does not
+        already exist. Otherwise, a ValueError is raised if it is not an
+        existing snapshot store.
+        """
+        self.store_dir = store_dir
+        self.object_dir = os.path.join(store_dir, OBJECT_DIR_NAME)
+        self.run_dir = os.path.join(store_dir, RUN_DIR_NAME)
+        for direc in (self.object_dir, self.run_dir):
+            if not os.path.isdir(direc):
+                if not create:
+                    raise ValueError("{0} is not a snapshot store".format(store_dir))
+                os.makedirs(direc)
+
+    def _object_path(self, obj_hash):
+        """
+        Returns the path of the stored object with hash `obj_hash`.
+        Objects are split into subdirectories by the first two characters of
+        their hash, to keep directory sizes manageable.
+        """
+        return os.path.join(self.object_dir, obj_hash[:2], obj_hash[2:])
+
+    def _run_path(self, date):
+        """
+        Returns the path of the manifest of the run on `date`.
+        """
+        return os.path.join(self.run_dir, "{0}.json".format(date))
+
+    def _write_file(self, path, data):
+        """
+        Writes `data` to `path` by writing a temporary file in the same
+        directory and renaming it into place, so that a crash mid-write
+        never leaves a truncated file at `path`.
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+        os.rename(temp_path, path)
+
+    def _put_object(self, study):
+        """
+        Stores a single study record, compressed, under the hash of its
+        contents. Returns the hash. If an identical record has already been
+        stored, nothing is written.
+        """
+        encoded = json.dumps(study, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        obj_hash = hashlib.sha1(encoded).hexdigest()
+        path = self._object_path(obj_hash)
+        if not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            self._write_file(path, zlib.compress(encoded))
+        return obj_hash
+
+    def _get_object(self, obj_hash):
+        """
+        Loads the study record stored under `obj_hash`, as a `StudyRecord`.
+        """
+        with open(self._object_path(obj_hash), "rb") as obj_file:
+            encoded = zlib.decompress(obj_file.read())
+        return StudyRecord.from_dict(json.loads(encoded.decode("utf-8")))
+
+    def _get_manifest(self, date):
+        """
+        Loads the manifest of the run on `date`. Raises a KeyError if no run
+        was recorded on that date.
+        """
+        path = self._run_path(date)
+        if not os.path.exists(path):
+            raise KeyError("No snapshot recorded for {0}".format(date))
+        return util.import_json(path)
+
+    def run_dates(self):
+        """
+        Returns the sorted list of dates (as "YYYY-MM-DD" strings) of all
+        recorded runs.
+        """
+        return sorted(name[:-len(".json")] for name in os.listdir(self.run_dir) if name.endswith(".json"))
+
+    def _get_index(self, date):
+        """
+        Reconstructs the index of the run on `date`, as a dictionary mapping
+        partial study IDs to the hashes of their records. Starting from the
+        nearest full checkpoint at or before `date`, replays the deltas of
+        each following run.
+        """
+        chain = []
+        manifest = self._get_manifest(date)
+        chain.append(manifest)
+        while not manifest["full"]:
+            manifest = self._get_manifest(manifest["parent"])
+            chain.append(manifest)
+
+        index = {}
+        for manifest in reversed(chain):
+            index.update(manifest["changed"])
+            for study_id in manifest["removed"]:
+                index.pop(study_id, None)
+        return index
+
+    def record_run(self, study_info, date=None):
+        """
+        Records the list of `StudyRecord`s `study_info` as the snapshot for
+        `date`.
+        By default, `date` is today's date. Only studies whose records differ
+        from the latest previous run are written.
+        If a run has already been recorded on `date`, it is replaced, as long
+        as it is the latest run. Recording a run before the latest run raises
+        a ValueError.
+        Returns the number of changed or removed studies.
+        """
+        if date is None:
+            date = datetime.date.today().isoformat()
+        dates = self.run_dates()
+        if dates and date < dates[-1]:
+            raise ValueError("Cannot record {0} before latest run {1}".format(date, dates[-1]))
+        if date in dates:
+            dates.remove(date)  # Replace today's run
+
+        parent = dates[-1] if dates else None
+        old_index = self._get_index(parent) if parent else {}
+        new_index = {}
+        for study in study_info:
+            new_index[study.part_id] = self._put_object(study.to_dict())
+
+        changed = dict((study_id, obj_hash) for study_id, obj_hash in new_index.items()
+                if old_index.get(study_id) != obj_hash)
+        removed = sorted(set(old_index) - set(new_index))
+
+        # Save a full index every so often, so reconstruction stays fast
+        full = len(dates) % CHECKPOINT_INTERVAL == 0
+        manifest = {
+            "date": date,
+            "parent": parent,
+            "full": full,
+            "changed": new_index if full else changed,
+            "removed": [] if full else removed
+        }
+        self._write_file(self._run_path(date), json.dumps(manifest).encode("utf-8"))
+        return len(changed) + len(removed)
+
+    def get_snapshot(self, date):
+        """
+        Reconstructs the list of `StudyRecord`s recorded on `date`, sorted by
+        partial study ID.
+        """
+        index = self._get_index(date)
+        return [self._get_object(index[study_id]) for study_id in sorted(index)]
+
+    def diff(self, old_date, new_date):
+        """
+        Compares the snapshots recorded on `old_date` and `new_date`, in the
+        same manner as `Updater._compare_study_info`. Only the records whose
+        contents differ between the two runs are loaded.
+        The following dictionary is returned:
+            new: [record, record, ...]
+            updates: [record, record, ...]
+        """
+        old_index = self._get_index(old_date)
+        new_index = self._get_index(new_date)
+
+        new_studies, update_studies = [], []
+        for study_id in sorted(new_index):
+            if study_id not in old_index:
+                new_studies.append(self._get_object(new_index[study_id]))
+            elif old_index[study_id] != new_index[study_id]:
+                old_study = self._get_object(old_index[study_id])
+                new_study = self._get_object(new_index[study_id])
+                if new_study.version > old_study.version:
+                    update_studies.append(new_study)
+
+        return {
+            "new": new_studies,
+            "updates": update_studies
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from update import Updater
+
+    parser = argparse.ArgumentParser(
+        description="Print the diff between two recorded snapshots of dbGaP scrapes."
+    )
+    parser.add_argument("store_dir", type=str,
+        help="Directory of the snapshot history."
+    )
+    parser.add_argument("old_date", nargs="?", default=None, type=str,
+        help="Date (YYYY-MM-DD) of the older snapshot. If not provided, lists the recorded dates."
+    )
+    parser.add_argument("new_date", nargs="?", default=None, type=str,
+        help="Date (YYYY-MM-DD) of the newer snapshot. Defaults to the latest recorded run."
+    )
+
+    args = parser.parse_args()
+
+    try:
+        store = SnapshotStore(args.store_dir, create=False)
+    except ValueError as e:
+        sys.exit("Error: {0}".format(e))
+
+    dates = store.run_dates()
+    if not dates:
+        sys.exit("Error: no runs recorded in {0}".format(args.store_dir))
+    if not args.old_date:
+        for date in dates:
+            print(date)
+    else:
+        new_date = args.new_date or dates[-1]
+        for date in (args.old_date, new_date):
+            if date not in dates:
+                sys.exit("Error: no run recorded on {0}".format(date))
+        Updater(None, None)._print_updates(store.diff(args.old_date, new_date))
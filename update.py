@@ -1,5 +1,8 @@
 import util
+from records import StudyRecord, iter_study_records, export_study_records
 from scrape import Scraper, EmptyResponseException
+from snapshot import SnapshotStore
+from versions import VersionIndex
 import sys
 
 class Updater:
@@ -13,11 +16,18 @@ class Updater:
         # No infile to read from, do not write output to outfile
         # Use this partial list of top-level studies
         upd = Updater(["phs1234567", "phs7654321"])
+
+        # Also record each run in a snapshot history
+        upd = Updater("infile.json", "outfile.json", snapshot_dir="snapshots")
+
+        # Keep an index of the newest known version of each study
+        upd = Updater("infile.json", "outfile.json", version_index_path="versions.json")
     Methods:
         upd.update_studies(fs=None, verbose=False)
     """
 
-    def __init__(self, infile, outfile, partial_study_ids=None):
+    def __init__(self, infile, outfile, partial_study_ids=None, snapshot_dir=None,
+            version_index_path=None):
         """
         `infile` is the path to the file in which the old study info is.
         This may be None if there is no such file. `outfile` is the path to
@@ -25,35 +35,55 @@ class Updater:
         results are not saved. If `infile` and `outfile` are the same, then
         the new information will overwrite the old.
         If `partial_study_ids` is passed in, only look at those studies.
+        If `snapshot_dir` is passed in, each run is also recorded as a
+        snapshot in that directory (see `SnapshotStore`).
+        If `version_index_path` is passed in, the index of newest known study
+        versions kept there (see `VersionIndex`) is used and updated by each
+        run.
         """
         self.infile = infile
         self.outfile = outfile
         self.partial_study_ids = partial_study_ids
+        self.snapshot_dir = snapshot_dir
+        self.version_index_path = version_index_path
 
-    def _fetch_newest_studies(self, verbose=False):
+    def _fetch_newest_studies(self, version_index=None, verbose=False):
         """
         Constructs a Scraper and downloads all the info in all available
         parent studies, or all studies in `self.partial_study_ids` if
-        provided.
-        Returns a list of dictionaries.
+        provided. If `version_index` is given, the Scraper uses it to fetch
+        the newest known version of each study directly, and records how
+        often a study page still had to be fetched again in it. If no info
+        can be found for a version taken from `version_index`, the version
+        listed on the FTP mirror is tried instead.
+        Returns a list of `StudyRecord`s.
         """
-        scr = Scraper(partial_study_ids=self.partial_study_ids)
+        scr = Scraper(partial_study_ids=self.partial_study_ids, version_index=version_index)
         full_study_list = scr.get_all_full_top_study_ids(verbose=verbose)
 
         if verbose:
             print("Fetching info for {0} top-level studies".format(len(full_study_list)))
    
+        def fetch_info(study_id):
+            try:
+                return scr.get_study_info(study_id, substudy_names=True, verbose=verbose)
+            except EmptyResponseException:
+                if verbose:
+                    print("No response for {0}".format(study_id))
+                return None
+
         study_info = []
         for study_id in full_study_list:
             if study_id is not None:
-                try:
-                    info = scr.get_study_info(study_id, substudy_names=True, verbose=verbose)
-                except EmptyResponseException:
+                info = fetch_info(study_id)
+                fallback_id = scr.fallback_ids.get(study_id)
+                if not info and fallback_id:
                     if verbose:
-                        print("No response for {0}".format(study_id))
-                    continue
+                        print("Falling back to {0} for {1}".format(fallback_id, study_id))
+                    study_id = fallback_id
+                    info = fetch_info(study_id)
                 if info:
-                    study_info.append(info)
+                    study_info.append(StudyRecord.from_dict(info))
                     if verbose:
                         print("Info fetched for {0}".format(study_id))
                 else:
@@ -62,27 +92,28 @@ class Updater:
             else:
                 if verbose:
                     print("No info found for a study")
+
+        if verbose:
+            print("Study pages not at newest version: {0} of {1}".format(scr.num_redirects, scr.num_study_pages))
+        if version_index:
+            version_index.record_run(scr.num_study_pages, scr.num_redirects)
         return study_info
 
-    def _compare_study_info(self, old_info, new_info):
+    def _compare_study_info(self, old_versions, new_info):
         """
-        Given two lists of study info (two lists of dictionaries), compares
-        the contents and returns the differences in `new_info`.
+        Given the versions of the old studies (a dictionary mapping partial
+        study IDs to version numbers) and the new study info (a list of
+        `StudyRecord`s), returns the differences in `new_info`.
         The following dictionary is returned:
-            new: [{...}, {...}]
-            updates: [{...}, {...}]
+            new: [record, record, ...]
+            updates: [record, record, ...]
         """
-        old_info_by_id = {d["id"]["part"]: d for d in old_info}
-        new_info_by_id = {d["id"]["part"]: d for d in new_info}
-
         # IDs in new, but not old
-        new_ids = set(new_info_by_id.keys()) - set(old_info_by_id.keys())
-        new_studies = [new_info_by_id[new_id] for new_id in new_ids]
+        new_studies = [record for record in new_info if record.part_id not in old_versions]
 
         # IDs that are in both new and old, but new version is higher
-        update_ids = [s_id for s_id in new_info_by_id if
-                (s_id in old_info_by_id) and (new_info_by_id[s_id]["id"]["version"] > old_info_by_id[s_id]["id"]["version"])]
-        update_studies = [new_info_by_id[update_id] for update_id in update_ids]
+        update_studies = [record for record in new_info if
+                (record.part_id in old_versions) and (record.version > old_versions[record.part_id])]
 
         return {
             "new": new_studies,
@@ -101,37 +132,39 @@ class Updater:
             fs = sys.stdout
 
         def write_top_study(top_study):
+            subs = top_study.subs
+            if not subs:
+                return
+
             # Write study ID and name
-            name = top_study["name"].encode("ascii", "ignore")
-            fs.write("{0}: {1}\n".format(top_study["id"]["full"], name))
+            name = top_study.name.encode("ascii", "ignore")
+            fs.write("{0}: {1}\n".format(top_study.full_id, name))
 
             # Write consent groups
-            consents = ", ".join(top_study["consents"])
+            consents = ", ".join(top_study.consents)
             fs.write("\tConsent groups: {0}\n".format(consents))
 
             # Write sbstudy IDs, names, and sequences
-            for sub in top_study["subs"]:
+            for sub in subs:
                 fs.write("\t{0}\n".format(sub))
-                if "name" in top_study["subs"][sub]:
-                    sub_title = top_study["subs"][sub]["name"].encode("ascii", "ignore")
+                if "name" in subs[sub]:
+                    sub_title = subs[sub]["name"].encode("ascii", "ignore")
                     if sub_title:
                         fs.write("\t\t{0}\n".format(sub_title))
-                seq_nums = ", ".join(["{0} {1}".format(num, seq_type) for seq_type, num in top_study["subs"][sub]["seqs"].iteritems()])
+                seq_nums = ", ".join(["{0} {1}".format(num, seq_type) for seq_type, num in subs[sub]["seqs"].iteritems()])
                 fs.write("\t\t{0}\n".format(seq_nums))
 
         fs.write("New studies\n")
         fs.write("----------------------------------------\n")
         for top_study in updates["new"]:
-            if top_study["subs"]:
-                write_top_study(top_study)
+            write_top_study(top_study)
 
         fs.write("\n")
 
         fs.write("Updated studies\n")
         fs.write("----------------------------------------\n")
         for top_study in updates["updates"]:
-            if top_study["subs"]:
-                write_top_study(top_study)
+            write_top_study(top_study)
 
     def update_studies(self, fs=None, verbose=False):
         """
@@ -140,74 +173,78 @@ class Updater:
         information there.
         Writes the difference of the update to `fs`, an open file stream. By
         default this is stdout.
+        If `self.version_index_path` was given, the version index there is
+        updated with every study version seen.
+        If `self.snapshot_dir` was given, also record this run's study
+        information as a snapshot there, after the diff has been written.
         Note that if `self.infile` was not provided, this is treated as
         everything in this update being new.
         """
-        old_info = util.import_json(self.infile) if self.infile else {}
-
-        new_info = self._fetch_newest_studies(verbose=verbose)
+        version_index = VersionIndex(self.version_index_path) if self.version_index_path else None
+
+        # Only the versions of the old studies are kept for the diff
+        old_versions = {}
+        if self.infile:
+            for record in iter_study_records(self.infile):
+                old_versions[record.part_id] = record.version
+                if version_index:
+                    version_index.observe(record.full_id)
+
+        new_info = self._fetch_newest_studies(version_index=version_index, verbose=verbose)
+        if version_index:
+            version_index.save()
         if self.outfile:
-            util.export_json(self.outfile, new_info)
+            export_study_records(self.outfile, new_info)
 
-        updates = self._compare_study_info(old_info, new_info)
+        updates = self._compare_study_info(old_versions, new_info)
         self._print_updates(updates, fs=fs)
 
+        # Record the snapshot last, so that any error here cannot lose the
+        # diff (the outfile may already have overwritten the infile)
+        if self.snapshot_dir:
+            num_changed = SnapshotStore(self.snapshot_dir).record_run(new_info)
+            if verbose:
+                print("Recorded snapshot with {0} changed studies".format(num_changed))
+
 
 def export_study_table(input_json_path, output_table_path):
     """
     Given the `input_json_path`, where the JSON of all studies in dbGaP are
     stored, create a TSV of that information.
     Creates a row for each study or substudy, and records the name, ID, and
-    number of whole genome and whole exome sequences. For top-level studies,
-    the number of sequences is the sum of its substudies. For top-level
-    studies without proper substudies, its substudy is itself, and this
-    duplicate is removed.
+    number of whole genome and whole exome sequences, as stored under
+    "counts" at scrape time. For top-level studies, the number of sequences
+    is the sum of its substudies. For top-level studies without proper
+    substudies, its substudy is itself, and this duplicate is removed.
     The columns are the following:
         study_id, parent_id, wgs_num, wes_num, seq_total (wgs_num + wes_num),
         consent_groups, name
 
     """
-    is_wgs = lambda key: "whole genome" in key or "wgs" in key
-    is_wes = lambda key: "whole exome" in key or "wes" in key or "wxs" in key
-
-    studies = util.import_json(input_json_path)
-
-    def write_line(fs, study_id, parent_id, wgs_num, wes_num, consents, name):
-        seq_total = str(int(wgs_num) + int(wes_num))
-        wgs_num, wes_num = str(wgs_num), str(wes_num)
+    def write_line(fs, study_id, parent_id, counts, consents, name):
+        wgs_num, wes_num, seq_total = str(counts["wgs"]), str(counts["wes"]), str(counts["total"])
         name = name.encode("ascii", "ignore")
         fs.write("\t".join([study_id, parent_id, wgs_num, wes_num, seq_total, consents, name]) + "\n")
 
-    def get_wgs(substudy):
-        wgs_keys = [key for key in substudy["seqs"] if is_wgs(key.lower())]
-        return substudy["seqs"][wgs_keys[0]] if wgs_keys else 0
-
-    def get_wes(substudy):
-        wes_keys = [key for key in substudy["seqs"] if is_wes(key.lower())]
-        return substudy["seqs"][wes_keys[0]] if wes_keys else 0
+    def get_counts(substudy):
+        # Study info scraped before counts were stored must be classified here
+        return substudy["counts"] if "counts" in substudy else util.sequence_counts(substudy["seqs"])
 
     with open(output_table_path, "w") as outfile:
         outfile.write("\t".join(["study_id", "parent_id", "wgs_num", "wes_num", "seq_total", "consent_groups", "name"]) + "\n")
-        for study in studies:
-            substudies = study["subs"]
-            consents = ", ".join(study["consents"])
-            if study["id"]["full"] in substudies:
+        for study in iter_study_records(input_json_path):
+            substudies = study.subs
+            consents = ", ".join(study.consents)
+            if study.full_id in substudies:
                 # The only "substudy" is itself
-                substudy = substudies[study["id"]["full"]]
-                wgs_num, wes_num = get_wgs(substudy), get_wes(substudy)
-                write_line(outfile, study["id"]["full"], "NA", wgs_num, wes_num, consents, substudy["name"])
+                substudy = substudies[study.full_id]
+                write_line(outfile, study.full_id, "NA", get_counts(substudy), consents, substudy["name"])
             else:
-                nums = {}
-                for substudy_id in substudies:
-                    substudy = substudies[substudy_id]
-                    nums[substudy_id] = (get_wgs(substudy), get_wes(substudy))
-                wgs_total = sum(nums[ssi][0] for ssi in nums)
-                wes_total = sum(nums[ssi][1] for ssi in nums)
-                write_line(outfile, study["id"]["full"], "NA", wgs_total, wes_total, consents, study["name"])
+                write_line(outfile, study.full_id, "NA", study.counts, consents, study.name)
                 for substudy_id in substudies:
                     # Note consents are written only for top-level studies
-                    write_line(outfile, substudy_id, study["id"]["full"], nums[substudy_id][0], nums[substudy_id][1], "", substudy["name"])
-
+                    substudy = substudies[substudy_id]
+                    write_line(outfile, substudy_id, study.full_id, get_counts(substudy), "", substudy["name"])
 
 
 if __name__ == "__main__":
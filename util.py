@@ -30,6 +30,55 @@ def version_num(study_id):
     return fields[1] if fields else None
 
 
+WGS_REGEX = re.compile(r"whole genome|wgs")
+WES_REGEX = re.compile(r"whole exome|wes|wxs")
+
+
+def classify_data_type(data_type):
+    """
+    Classifies a sequencing data type (e.g. "WGS" or "Whole Exome
+    Sequencing") as whole genome and/or whole exome sequences.
+    Returns a tuple containing "wgs", "wes", both (e.g. for "WGS/WES"), or
+    neither if the data type is not of interest.
+    """
+    data_type = data_type.lower()
+    seq_classes = ()
+    if WGS_REGEX.search(data_type):
+        seq_classes += ("wgs",)
+    if WES_REGEX.search(data_type):
+        seq_classes += ("wes",)
+    return seq_classes
+
+
+def sequence_counts(seqs):
+    """
+    Given a dictionary mapping sequencing data types to numbers of sequences,
+    as stored under "seqs" for a substudy, returns a dictionary of the total
+    numbers of whole genome and whole exome sequences:
+        {wgs: 100, wes: 200, total: 300}
+    Data types that are both whole genome and whole exome count towards
+    both, and `total` is always the sum of `wgs` and `wes`.
+    """
+    counts = {"wgs": 0, "wes": 0, "total": 0}
+    for data_type, num in seqs.items():
+        for seq_class in classify_data_type(data_type):
+            counts[seq_class] += num
+            counts["total"] += num
+    return counts
+
+
+def sum_sequence_counts(counts_list):
+    """
+    Sums a list of dictionaries of sequence counts, as `sequence_counts`
+    returns, into a single dictionary of the same form.
+    """
+    total = {"wgs": 0, "wes": 0, "total": 0}
+    for counts in counts_list:
+        for key in total:
+            total[key] += counts[key]
+    return total
+
+
 def import_json(file_path):
     """
     From `file_path`, imports a JSON object into Python.
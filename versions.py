@@ -0,0 +1,73 @@
+import os
+import datetime
+import util
+
+
+class VersionIndex:
+    """
+    Persistent index of the newest known full ID of each top-level study.
+    The index is built from every full study ID seen while scraping (FTP
+    listings, study history tables, previous results), so that the study
+    page of the newest version can be fetched directly.
+    Also keeps a history of how often, in each run, a study page turned out
+    not to be the newest version and had to be fetched again.
+    Initialization:
+        index = VersionIndex("data/versions.json")  # Loaded if it exists
+    Methods:
+        index.observe(full_study_id)
+        index.latest(study_id)
+        index.record_run(num_studies, num_redirects, date=None)
+        index.save()
+    """
+
+    def __init__(self, path):
+        """
+        `path` is the JSON file in which the index is kept. If it does not
+        exist yet, the index starts out empty.
+        """
+        self.path = path
+        if os.path.exists(path):
+            data = util.import_json(path)
+            self.newest_ids = data["latest"]
+            self.runs = data["runs"]
+        else:
+            self.newest_ids = {}
+            self.runs = []
+
+    def observe(self, full_study_id):
+        """
+        Records that `full_study_id` (e.g. "phs1234567.v8.p1") exists. If it
+        is newer than the newest known version of its study, it becomes the
+        newest known version. Improperly formatted IDs are ignored.
+        """
+        fields = util.study_id_fields(full_study_id) if full_study_id else None
+        if not fields:
+            return
+        known_id = self.newest_ids.get(fields[0])
+        if known_id is None or util.study_id_fields(known_id)[1:] < fields[1:]:
+            self.newest_ids[fields[0]] = "{0}.v{1}.p{2}".format(*fields)
+
+    def latest(self, study_id):
+        """
+        Given a partial study ID (e.g. "phs1234567"), returns the newest
+        known full study ID, or None if the study has not been seen.
+        """
+        return self.newest_ids.get(study_id)
+
+    def record_run(self, num_studies, num_redirects, date=None):
+        """
+        Records that in the run on `date` (by default, today), `num_studies`
+        study pages were scraped, of which `num_redirects` were not the
+        newest version and had to be fetched again.
+        If a run has already been recorded on `date`, it is replaced.
+        """
+        if date is None:
+            date = datetime.date.today().isoformat()
+        self.runs = [run for run in self.runs if run["date"] != date]
+        self.runs.append({"date": date, "studies": num_studies, "redirects": num_redirects})
+
+    def save(self):
+        """
+        Writes the index to `self.path`.
+        """
+        util.export_json(self.path, {"latest": self.newest_ids, "runs": self.runs})